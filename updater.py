@@ -1,22 +1,45 @@
 import os
+import sys
 import re
 import shutil
 import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import zipfile
-import json
+import orjson
+import tomllib
+import hashlib
 import traceback
 import argparse
+import threading
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
 
 # === CONFIG ===
 MODRINTH_API = "https://api.modrinth.com/v2"
 
+# Number of concurrent Modrinth API requests
+MAX_WORKERS = 16
+# Number of mod files downloaded at the same time
+MAX_DOWNLOADS = 4
+# Read/write buffer used when saving downloaded mod files
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# Number of jars copied at the same time when backing up across drives
+MAX_COPY_WORKERS = 8
+# Number of project IDs sent in each bulk /projects request
+PROJECTS_BATCH_SIZE = 100
+
 MOD_ID_OVERRIDES = {
     "voicechat": "simple-voice-chat",
     "voicechat-fabric": "simple-voice-chat",
 }
 
+# Patterns used to turn a jar filename into a likely mod id
+_LOADER_RE = re.compile(r'[-_.]?(?:fabric|forge|quilt|neo\w*)[-_.]?')
+_DIGIT_SPLIT_RE = re.compile(r'[-_.]?\d')
+
 # Auto-detect .minecraft directory
 try:
     MINECRAFT_DIR = os.path.join(os.environ["APPDATA"], ".minecraft")
@@ -25,9 +48,48 @@ except KeyError:
     if not os.path.exists(MINECRAFT_DIR):
         MINECRAFT_DIR = os.path.join(os.path.expanduser("~"), ".minecraft")
 MODS_DIR = os.path.join(MINECRAFT_DIR, "mods")
+# Remembers which Modrinth project and version each jar (by SHA-1) was matched to
+JAR_CACHE_FILE = os.path.join(MINECRAFT_DIR, ".updater_cache.json")
+
+# Shared HTTP session so connections to Modrinth are kept alive and reused across threads.
+# API responses are cached on disk between runs and revalidated with ETags once stale.
+SESSION = requests_cache.CachedSession(
+    "modrinth_cache",
+    backend="sqlite",
+    use_cache_dir=True,
+    expire_after=3600,
+    cache_control=True,
+    urls_expire_after={
+        "api.modrinth.com/v2/project/*/version": 900,  # new versions appear often
+        "cdn.modrinth.com": requests_cache.DO_NOT_CACHE,  # mod files themselves
+    },
+)
+# The pool holds a connection for every worker thread; connections beyond pool_maxsize would be
+# thrown away after one request and cost a fresh TLS handshake each time.
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,  # api.modrinth.com and cdn.modrinth.com
+    pool_maxsize=MAX_WORKERS + MAX_DOWNLOADS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+# Accept-Encoding is left to requests (>= 2.26) and urllib3 (>= 1.25), which only offer Brotli
+# when the brotli package can actually be imported to decode it
+SESSION.headers.update({
+    "User-Agent": "mod-updater/1.0 (github.com/slogiker/mod-updator-python)",
+})
+
+# Download threads and the main thread share stdout
+PRINT_LOCK = threading.Lock()
+
+# Projects already fetched during this run; failed lookups are left out so they can be retried
+_PROJECT_CACHE = {}
 
 # === FUNCTIONS ===
 
+def log(message):
+    """Prints a line without interleaving it with output from other threads."""
+    with PRINT_LOCK:
+        print(message)
+
 def log_crash(exception):
     """Logs unhandled exceptions to a debug.txt file."""
     log_file = "debug.txt"
@@ -38,15 +100,21 @@ def log_crash(exception):
         f.write("\n--- END OF LOG ---\n\n")
     print(f"\n[CRITICAL] An unexpected error occurred! A crash report has been saved to '{log_file}'.")
 
+def _json(resp):
+    """Decodes a JSON response body with orjson."""
+    return orjson.loads(resp.content)
+
 def get_project_from_id(project_id):
-    """Fetches a project's details using its slug or ID."""
+    """Fetches a project's details using its slug or ID, remembering successful lookups."""
     if not project_id: return None
+    if project_id in _PROJECT_CACHE: return _PROJECT_CACHE[project_id]
     url = f"{MODRINTH_API}/project/{project_id}"
     try:
-        resp = requests.get(url)
+        resp = SESSION.get(url)
         resp.raise_for_status()
-        return resp.json()
-    except requests.RequestException:
+        project = _PROJECT_CACHE[project_id] = _json(resp)
+        return project
+    except (requests.RequestException, orjson.JSONDecodeError):
         return None
 
 def search_project_by_name(query):
@@ -55,29 +123,88 @@ def search_project_by_name(query):
     url = f"{MODRINTH_API}/search"
     params = {"query": query, "limit": 1}
     try:
-        resp = requests.get(url, params=params)
+        resp = SESSION.get(url, params=params)
         resp.raise_for_status()
-        hits = resp.json().get("hits", [])
-        return hits[0] if hits else None
-    except requests.RequestException:
+        hits = _json(resp).get("hits", [])
+        if not hits: return None
+        # Search hits name the project ID "project_id"; expose it as "id" like full project objects
+        return {**hits[0], "id": hits[0].get("project_id")}
+    except (requests.RequestException, orjson.JSONDecodeError):
         return None
 
-def find_modrinth_project(jar_path, filename):
-    """A robust, multi-step process to find a mod's project page."""
+def get_versions_by_hashes(hashes):
+    """Looks up many jar files in one request by SHA-1, returning {hash: version}."""
+    if not hashes: return {}
+    url = f"{MODRINTH_API}/version_files"
+    try:
+        resp = SESSION.post(url, json={"hashes": hashes, "algorithm": "sha1"})
+        resp.raise_for_status()
+        return _json(resp)
+    except (requests.RequestException, orjson.JSONDecodeError):
+        return {}
+
+def get_projects(project_ids):
+    """Fetches the details of several projects, a batch of IDs per request."""
+    url = f"{MODRINTH_API}/projects"
+    project_ids = sorted(project_ids)
+    projects = []
+    # Batched so large modpacks don't produce URLs long enough to be rejected
+    for i in range(0, len(project_ids), PROJECTS_BATCH_SIZE):
+        params = {"ids": orjson.dumps(project_ids[i:i + PROJECTS_BATCH_SIZE]).decode()}
+        try:
+            resp = SESSION.get(url, params=params)
+            resp.raise_for_status()
+            projects.extend(_json(resp))
+        except (requests.RequestException, orjson.JSONDecodeError):
+            pass
+    return projects
+
+def load_jar_cache():
+    """Loads the SHA-1 -> project cache saved by previous runs."""
+    try:
+        with open(JAR_CACHE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+def save_jar_cache(jar_cache):
+    """Writes the SHA-1 -> project cache back to disk."""
+    with open(JAR_CACHE_FILE, "wb") as f:
+        f.write(orjson.dumps(jar_cache, option=orjson.OPT_INDENT_2))
+
+def read_mod_id(jar_path):
+    """Reads the mod id from the loader metadata inside a jar, opening it only once."""
+    with zipfile.ZipFile(jar_path, 'r') as jar:
+        try:
+            data = orjson.loads(jar.read('fabric.mod.json'))
+            return data.get('custom', {}).get('modrinth') or data.get('id')
+        except KeyError:
+            pass
+        try:
+            data = orjson.loads(jar.read('quilt.mod.json'))
+            return data.get('quilt_loader', {}).get('id')
+        except KeyError:
+            pass
+        for meta_path in ('META-INF/mods.toml', 'META-INF/neoforge.mods.toml'):
+            try:
+                data = tomllib.loads(jar.read(meta_path).decode('utf-8'))
+                mods = data.get('mods') or [{}]
+                return mods[0].get('modId')
+            except KeyError:
+                pass
+    return None
+
+def guess_modrinth_project(jar_path, filename):
+    """Guesses a mod's project from its metadata or filename."""
     mod_id = None
     try:
-        with zipfile.ZipFile(jar_path, 'r') as jar:
-            meta_path = 'fabric.mod.json'
-            if meta_path in jar.namelist():
-                with jar.open(meta_path) as meta_file:
-                    data = json.load(meta_file)
-                    mod_id = data.get('custom', {}).get('modrinth') or data.get('id')
-    except (zipfile.BadZipFile, json.JSONDecodeError, KeyError, FileNotFoundError):
+        mod_id = read_mod_id(jar_path)
+    except (zipfile.BadZipFile, orjson.JSONDecodeError, tomllib.TOMLDecodeError, UnicodeDecodeError, FileNotFoundError):
         pass
 
     if not mod_id:
-        mod_id = re.sub(r'[-_.]?(fabric|forge|quilt|neo\w*)[-_.]?', '', filename.lower().removesuffix(".jar"))
-        mod_id = re.split(r'[-_.]?\d', mod_id, 1)[0].strip("-_.")
+        mod_id = _LOADER_RE.sub('', filename.lower().removesuffix(".jar"))
+        mod_id = _DIGIT_SPLIT_RE.split(mod_id, 1)[0].strip("-_.")
 
     if mod_id in MOD_ID_OVERRIDES:
         mod_id = MOD_ID_OVERRIDES[mod_id]
@@ -86,40 +213,85 @@ def find_modrinth_project(jar_path, filename):
     if project: return project
     return search_project_by_name(mod_id)
 
+def hash_jar(jar_path):
+    """Computes the SHA-1 hash Modrinth uses to identify a jar file."""
+    with open(jar_path, "rb") as jar_file:
+        return hashlib.file_digest(jar_file, "sha1").hexdigest()
+
+def identify_mods(executor, jar_paths, jar_cache):
+    """Yields (filename, project, version_id) for each jar as soon as its project is known.
+
+    Jars are matched by SHA-1, first against the local cache and then with a single bulk
+    lookup. Only jars Modrinth doesn't recognize fall back to guessing from metadata, and
+    for those the installed version_id is unknown (None). Guesses are never cached, so
+    they are redone (and pick up MOD_ID_OVERRIDES changes) on every run.
+    """
+    hashes = dict(zip(jar_paths, executor.map(hash_jar, jar_paths.values())))
+    unknown = {}
+    for filename, sha1 in hashes.items():
+        entry = jar_cache.get(sha1)
+        if entry and entry.get("id") and entry.get("version_id"):
+            yield filename, entry, entry["version_id"]
+        else:
+            unknown[filename] = sha1
+
+    versions = get_versions_by_hashes(list(set(unknown.values())))
+    projects = {p["id"]: p for p in get_projects({v["project_id"] for v in versions.values()})}
+    guesses = {}
+    for filename, sha1 in unknown.items():
+        version = versions.get(sha1, {})
+        project = projects.get(version.get("project_id"))
+        if project:
+            jar_cache[sha1] = {"id": project["id"], "slug": project["slug"], "title": project.get("title"), "version_id": version.get("id")}
+            yield filename, project, version.get("id")
+        else:
+            guesses[executor.submit(guess_modrinth_project, jar_paths[filename], filename)] = filename
+
+    for fut in as_completed(guesses):
+        yield guesses[fut], fut.result(), None
+
 def get_mod_versions(project_id):
     """Gets all available versions for a project."""
     url = f"{MODRINTH_API}/project/{project_id}/version"
-    resp = requests.get(url)
+    resp = SESSION.get(url)
     resp.raise_for_status()
-    return resp.json()
+    return _json(resp)
 
 def filter_versions(versions, game_version, loader):
     """Filters versions, prioritizing 'release' type."""
-    candidates = [v for v in versions if game_version in v.get("game_versions", []) and loader in v.get("loaders", [])]
-    if not candidates: return []
-    release_versions = [v for v in candidates if v.get("version_type") == "release"]
-    return release_versions if release_versions else candidates
+    release_versions, candidates = [], []
+    for v in versions:
+        if game_version in v.get("game_versions", ()) and loader in v.get("loaders", ()):
+            candidates.append(v)
+            if v.get("version_type") == "release":
+                release_versions.append(v)
+    return release_versions or candidates
 
 def download_version(version_info, dry_run=False):
     """Downloads the primary file for a given version object, or simulates it."""
     primary_file = next((f for f in version_info.get("files", []) if f.get("primary")), None)
     if not primary_file:
-        print("  [ERROR] No primary file found for this version.")
+        log("  [ERROR] No primary file found for this version.")
         return
     
     fname = primary_file.get("filename")
     if dry_run:
-        print(f"  [DRY RUN] Would download {fname}")
+        log(f"  [DRY RUN] Would download {fname}")
         return
 
     outpath = os.path.join(MODS_DIR, fname)
-    print(f"  [DOWNLOAD] Starting download of {fname}...")
-    with requests.get(primary_file.get("url"), stream=True) as r:
+    log(f"  [DOWNLOAD] Starting download of {fname}...")
+    with SESSION.get(primary_file.get("url"), stream=True) as r:
         r.raise_for_status()
-        with open(outpath, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-    print(f"  [SAVED] Successfully saved to {outpath}")
+        r.raw.decode_content = True
+        with open(outpath, "wb", buffering=DOWNLOAD_BUFFER_SIZE) as f:
+            shutil.copyfileobj(r.raw, f, length=DOWNLOAD_BUFFER_SIZE)
+    log(f"  [SAVED] Successfully saved to {outpath}")
+
+def restore_jar(backup_path):
+    """Copies an unchanged jar from the backup back into the mods folder."""
+    # A copy rather than a hard link, so nothing written to the mods folder can alter the backup
+    shutil.copy2(backup_path, os.path.join(MODS_DIR, os.path.basename(backup_path)))
 
 # === MAIN ===
 
@@ -144,7 +316,9 @@ def main():
         print("\n[INFO] DRY RUN enabled. No files will be changed.")
 
     if not os.path.exists(MODS_DIR): os.makedirs(MODS_DIR)
-    local_mods = [f for f in os.listdir(MODS_DIR) if f.endswith(".jar")]
+    with os.scandir(MODS_DIR) as entries:
+        jar_paths = {e.name: e.path for e in entries if e.name.endswith(".jar") and e.is_file()}
+    local_mods = list(jar_paths)
     
     if not local_mods:
         print(f"\n[INFO] No mods found in your mods directory.")
@@ -168,68 +342,126 @@ def main():
             backup_dir = f"{base_backup_dir}-{i}"
         
         print(f"\n[INFO] Backing up {len(local_mods)} mods to '{backup_dir}'...")
-        shutil.copytree(MODS_DIR, backup_dir)
-        for filename in local_mods:
-            os.remove(os.path.join(MODS_DIR, filename))
+        os.makedirs(backup_dir)
+        backup_paths = {f: os.path.join(backup_dir, f) for f in local_mods}
+        if os.stat(MODS_DIR).st_dev == os.stat(backup_dir).st_dev:
+            # Same filesystem: moving is a cheap rename, no data is copied. Bind mounts can share
+            # st_dev and still refuse to rename across them, so fall back to a real move.
+            for f, dst in backup_paths.items():
+                try:
+                    os.rename(jar_paths[f], dst)
+                except OSError:
+                    shutil.move(jar_paths[f], dst)
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_COPY_WORKERS) as ex:
+                list(ex.map(shutil.move, jar_paths.values(), backup_paths.values()))
+        jar_paths = backup_paths
 
     summary, mods_to_process, processed_or_queued = {}, deque(), set()
 
-    print("\n[ Step 1: Analyzing Your Existing Mods ]")
-    for filename in local_mods:
-        jar_path = os.path.join(backup_dir, filename)
-        project = find_modrinth_project(jar_path, filename)
-        
-        if project and project.get("slug"):
-            slug, title = project["slug"], project.get("title")
-            if slug not in processed_or_queued:
-                print(f"  [QUEUED] {title}")
-                mods_to_process.append(slug)
-                processed_or_queued.add(slug)
-                summary[slug] = {"title": title, "status": "Queued", "version": "---"}
-        else:
-            summary[filename] = {"title": filename, "status": "Not Found", "version": "---"}
-            print(f"  [UNKNOWN] Could not identify '{filename}' on Modrinth.")
-
-    print("\n[ Step 2: Checking for Updates and Dependencies ]")
-    while mods_to_process:
-        slug = mods_to_process.popleft()
-        project_title = summary[slug]["title"]
-        print(f"\n>> Processing: {project_title}")
-
-        versions = get_mod_versions(slug)
-        candidates = filter_versions(versions, game_version, loader)
-
-        if not candidates:
-            print("  [INFO] No compatible version found.")
-            summary[slug].update({"status": "No Update", "version": "N/A"})
-            continue
-        
-        latest = candidates[0]
-        ver_num, ver_type = latest.get("version_number"), latest.get("version_type")
-        print(f"  [FOUND] Best version: {ver_num} (Type: {ver_type})")
-        download_version(latest, dry_run=DRY_RUN)
-        summary[slug].update({"status": "Would Update" if DRY_RUN else "Updated", "version": ver_num})
-
-        for dep in latest.get("dependencies", []):
-            if dep.get("dependency_type") == "required":
-                dep_slug = dep.get("project_id")
-                if dep_slug and dep_slug not in processed_or_queued:
-                    dep_details = get_project_from_id(dep_slug)
+    # One API pool serves both steps, so work from Step 1 keeps flowing into Step 2
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex, ThreadPoolExecutor(max_workers=MAX_DOWNLOADS) as dl:
+        print("\n[ Step 1: Analyzing Your Existing Mods ]")
+        jar_cache = load_jar_cache()
+        identified, prefetched, installed = {}, {}, {}
+        for filename, project, version_id in identify_mods(ex, jar_paths, jar_cache):
+            identified[filename] = project
+            project_id = project and project.get("id")
+            if project_id and version_id:
+                installed.setdefault(project_id, (version_id, jar_paths[filename]))
+            if project_id and project_id not in prefetched:
+                # Start fetching versions right away so Step 2 does not wait for the slowest jar
+                prefetched[project_id] = ex.submit(get_mod_versions, project_id)
+        if not DRY_RUN:
+            save_jar_cache(jar_cache)
+
+        for filename in local_mods:
+            project = identified[filename]
+            if project and project.get("id"):
+                project_id, title = project["id"], project.get("title")
+                if project_id not in processed_or_queued:
+                    print(f"  [QUEUED] {title}")
+                    mods_to_process.append(project_id)
+                    processed_or_queued.add(project_id)
+                    summary[project_id] = {"title": title, "status": "Queued", "version": "---"}
+            else:
+                summary[filename] = {"title": filename, "status": "Not Found", "version": "---"}
+                print(f"  [UNKNOWN] Could not identify '{filename}' on Modrinth.")
+
+        log("\n[ Step 2: Checking for Updates and Dependencies ]")
+        # Each mod moves on as soon as its own lookups finish, so metadata requests for
+        # newly found dependencies overlap with downloads and slower lookups elsewhere
+        version_lookups, dep_lookups, downloads = {}, {}, []
+        while mods_to_process or version_lookups or dep_lookups:
+            while mods_to_process:
+                project_id = mods_to_process.popleft()
+                lookup = prefetched.pop(project_id, None) or ex.submit(get_mod_versions, project_id)
+                version_lookups[lookup] = project_id
+
+            done, _ = wait([*version_lookups, *dep_lookups], return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in dep_lookups:
+                    dep_id, parent_title = dep_lookups.pop(fut)
+                    dep_details = fut.result()
                     if dep_details:
                         dep_title = dep_details.get("title")
-                        print(f"  [DEPENDENCY] Found required mod: '{dep_title}'. Adding to queue.")
-                        mods_to_process.append(dep_slug)
-                        processed_or_queued.add(dep_slug)
-                        summary[dep_slug] = {"title": dep_title, "status": "Queued", "version": "---"}
-
-    print("\n\n+==================================================================+")
-    print("|                         UPDATE SUMMARY                         |")
-    print("+------------------------------------+-----------------+-------------+")
-    print(f"| {'Mod Name':<34} | {'Status':<15} | {'Version':<11} |")
-    print("+------------------------------------+-----------------+-------------+")
-    for item in summary.values():
-        print(f"| {item['title']:<34.34} | {item['status']:<15} | {item['version']:<11.11} |")
-    print("+------------------------------------+-----------------+-------------+")
+                        log(f"  [DEPENDENCY] '{parent_title}' requires '{dep_title}'. Adding to queue.")
+                        mods_to_process.append(dep_id)
+                        summary[dep_id] = {"title": dep_title, "status": "Queued", "version": "---"}
+                    else:
+                        # Let a later mod requiring it try the lookup again
+                        processed_or_queued.discard(dep_id)
+                    continue
+
+                project_id = version_lookups.pop(fut)
+                project_title = summary[project_id]["title"]
+                log(f"\n>> Processing: {project_title}")
+                candidates = filter_versions(fut.result(), game_version, loader)
+
+                if not candidates:
+                    log("  [INFO] No compatible version found.")
+                    summary[project_id].update({"status": "No Update", "version": "N/A"})
+                    continue
+
+                latest = candidates[0]
+                ver_num, ver_type = latest.get("version_number"), latest.get("version_type")
+                installed_id, jar_path = installed.get(project_id, (None, None))
+                if installed_id == latest.get("id"):
+                    log(f"  [UP TO DATE] Installed version {ver_num} is already the latest.")
+                    if not DRY_RUN:
+                        downloads.append(dl.submit(restore_jar, jar_path))
+                    summary[project_id].update({"status": "Up to date", "version": ver_num})
+                else:
+                    log(f"  [FOUND] Best version: {ver_num} (Type: {ver_type})")
+                    downloads.append(dl.submit(download_version, latest, DRY_RUN))
+                    summary[project_id].update({"status": "Would Update" if DRY_RUN else "Updated", "version": ver_num})
+
+                for dep in latest.get("dependencies", []):
+                    if dep.get("dependency_type") == "required":
+                        dep_id = dep.get("project_id")
+                        if not dep_id:
+                            continue
+                        # Claimed as soon as the lookup starts, so one set covers queued mods and
+                        # lookups still in flight; add() both checks and claims in a single lookup
+                        claimed = len(processed_or_queued)
+                        processed_or_queued.add(dep_id)
+                        if len(processed_or_queued) != claimed:
+                            dep_lookups[ex.submit(get_project_from_id, dep_id)] = (dep_id, project_title)
+
+        for fut in downloads:
+            fut.result()
+
+    separator = "+------------------------------------+-----------------+-------------+"
+    rows = [
+        "\n\n+==================================================================+",
+        "|                         UPDATE SUMMARY                         |",
+        separator,
+        f"| {'Mod Name':<34} | {'Status':<15} | {'Version':<11} |",
+        separator,
+    ]
+    rows.extend(f"| {item['title']:<34.34} | {item['status']:<15} | {item['version']:<11.11} |" for item in summary.values())
+    rows.append(separator)
+    sys.stdout.write("\n".join(rows) + "\n")
 
     if not DRY_RUN:
         print(f"\n[DONE] Old mods are safely backed up in: {backup_dir}")